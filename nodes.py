@@ -1,16 +1,18 @@
-import copy
+from array import array
 import numpy as np
 import torch
 import sys
 import os
-import cv2
-import json
+
+# Per-call diagnostics are noisy when ComfyUI runs the node per frame; opt in with DWRESTORATOR_DEBUG=1
+DEBUG = os.environ.get("DWRESTORATOR_DEBUG") == "1"
 
 # Try to import DWPose utilities - local first, fallback to controlnet_aux
 try:
     # Try relative import (when loaded as package)
     from .pose_visualization import (
         decode_json_as_poses,
+        decode_arrays_as_poses,
         draw_poses
     )
     DWPOSE_AVAILABLE = True
@@ -20,6 +22,7 @@ except ImportError as e1:
         # Try absolute import (when loaded as standalone)
         from pose_visualization import (
             decode_json_as_poses,
+            decode_arrays_as_poses,
             draw_poses
         )
         DWPOSE_AVAILABLE = True
@@ -30,6 +33,8 @@ except ImportError as e1:
                 decode_json_as_poses,
                 draw_poses
             )
+            # controlnet_aux only decodes flat lists; drawing builds a minimal list-form pose for it
+            decode_arrays_as_poses = None
             DWPOSE_AVAILABLE = True
             print("[DWRestorator] Using controlnet_aux pose visualization module")
         except ImportError as e3:
@@ -72,23 +77,107 @@ HAND_HIERARCHY = {
     17: 0, 18: 17, 19: 18, 20: 19,  # Pinky
 }
 
+
+def _hierarchy_levels(hierarchy):
+    """
+    Split a child -> parent hierarchy into depth levels, parents before children.
+    Each level is a (child_idx, parent_idx) pair of parallel int32 index arrays.
+    """
+    depths = {}
+
+    def depth_of(idx):
+        if idx not in hierarchy:
+            return 0
+        if idx not in depths:
+            depths[idx] = depth_of(hierarchy[idx]) + 1
+        return depths[idx]
+
+    levels = {}
+    for child, parent in hierarchy.items():
+        levels.setdefault(depth_of(child), []).append((child, parent))
+    return tuple(
+        (np.array([c for c, _ in pairs], dtype=np.int32), np.array([p for _, p in pairs], dtype=np.int32))
+        for _, pairs in sorted(levels.items())
+    )
+
+
+# Hierarchies in topological order, built once at import
+BODY_LEVELS = _hierarchy_levels(BODY_HIERARCHY)
+HAND_LEVELS = _hierarchy_levels(HAND_HIERARCHY)
+
+# Flat keypoint lists carried by each person dict
+KEYPOINT_KEYS = (
+    "pose_keypoints_2d",
+    "face_keypoints_2d",
+    "hand_left_keypoints_2d",
+    "hand_right_keypoints_2d",
+)
+
+_PERSON_KEYS = frozenset(KEYPOINT_KEYS)
+
+# Regions restored by dwrestore, in order: (person key, hierarchy levels, label).
+# The face has no hierarchy and is restored from the nearest existing landmark instead.
+RESTORE_REGIONS = (
+    ("pose_keypoints_2d", BODY_LEVELS, "Body"),
+    ("hand_left_keypoints_2d", HAND_LEVELS, "Left Hand"),
+    ("hand_right_keypoints_2d", HAND_LEVELS, "Right Hand"),
+    ("face_keypoints_2d", None, "Face"),
+)
+
 # Face hierarchy - use local regions with face center as anchor
 # Simplified: group landmarks by facial regions
 FACE_CENTER_IDX = 33  # Nose tip as center (approximate)
 
 
-def convert_to_python_types(obj):
-    """Recursively convert numpy/torch types to native Python types for JSON serialization."""
-    if isinstance(obj, (np.ndarray, torch.Tensor)):
-        obj = obj.tolist() if hasattr(obj, 'tolist') else float(obj)
-    
-    if isinstance(obj, (np.integer, np.floating)):
-        return float(obj) if isinstance(obj, np.floating) else int(obj)
-    elif isinstance(obj, dict):
-        return {k: convert_to_python_types(v) for k, v in obj.items()}
-    elif isinstance(obj, (list, tuple)):
-        return [convert_to_python_types(item) for item in obj]
-    return obj
+_CUDA_AVAILABLE = None
+
+
+def _cuda_available():
+    """torch.cuda.is_available(), probed on the first GPU request and remembered afterwards."""
+    global _CUDA_AVAILABLE
+    if _CUDA_AVAILABLE is None:
+        _CUDA_AVAILABLE = torch.cuda.is_available()
+    return _CUDA_AVAILABLE
+
+
+def get_people(pose_data):
+    """
+    Return the "people" list of a POSE_KEYPOINT structure as seen by decode_json_as_poses:
+    the top-level dict itself or the first element of a list. Returns [] if there is none.
+    """
+    top = pose_data[0] if isinstance(pose_data, list) and pose_data else pose_data
+    return top.get("people", []) if isinstance(top, dict) else []
+
+
+def get_person0(pose_data):
+    """
+    Return the first person dict of a POSE_KEYPOINT structure, or None if the structure is unsupported.
+
+    pose_data may be:
+    - a top-level dict containing "people": [...]
+    - a list containing a top-level dict like {"people": [ {...} ], ...}
+    - a list of person dicts (people list) -> [ {pose..}, ... ]
+    """
+    first = pose_data[0] if isinstance(pose_data, list) and pose_data else pose_data
+    if not isinstance(first, dict):
+        return None
+    people = first.get("people")
+    if isinstance(people, list) and people:
+        return people[0]
+    # Only a list may directly contain person dict(s)
+    if first is not pose_data and not _PERSON_KEYS.isdisjoint(first):
+        return first
+    return None
+
+
+def _as_kp_array(flat_keypoints):
+    """Parse a flat [x, y, c, ...] list into an (N, 3) float64 array, dropping a trailing partial triplet."""
+    return np.asarray(flat_keypoints[:len(flat_keypoints) // 3 * 3], dtype=np.float64).reshape(-1, 3)
+
+
+def _from_kp_array(keypoints):
+    """Flatten an (N, 3) keypoint array back into a flat list of Python floats."""
+    return keypoints.ravel().tolist()
 
 
 class DwRestorator:
@@ -101,6 +190,7 @@ class DwRestorator:
                 "reduce_confidence": ("BOOLEAN", {"default": True}),
                 "confidence_reduction_factor": ("FLOAT", {"default": 0.7, "min": 0.0, "max": 1.0, "step": 0.1}),
                 "use_gpu": ("BOOLEAN", {"default": False}),
+                "render_image": ("BOOLEAN", {"default": True}),
             },
         }
 
@@ -109,423 +199,375 @@ class DwRestorator:
     CATEGORY = "DWPoseRestorator"
     FUNCTION = "dwrestore"
 
-    def _is_keypoint_missing(self, x, y, confidence):
-        """Check if a keypoint is missing (zero coordinates and low/zero confidence)"""
-        return x == 0.0 and y == 0.0 and confidence == 0.0
+    def __init__(self):
+        # key -> (copy of the reference values last converted, their read-only (N, 3) array)
+        self._ref_arrays = {}
+        # Last rendered pose image and the exact pose bytes it was drawn from
+        self._last_image_key = None
+        self._last_image = None
+        # uint8 drawing buffer reused across frames of the same canvas size
+        self._canvas = None
 
-    def _estimate_affine_transform(self, keypoints_current, keypoints_ref):
+    def _estimate_affine_transforms(self, keypoint_pairs):
         """
-        Estimate affine transformation (rotation + scale + translation) from existing keypoints.
-        Uses least squares fitting on existing keypoints to find the best transformation.
-        
+        Estimate affine transformations (rotation + scale + translation) from existing keypoints.
+        Solves the least squares fit of every region in closed form (normal equations),
+        stacking all regions into one batched solve.
+
         Args:
-            keypoints_current: List of (x, y, conf) for current pose
-            keypoints_ref: List of (x, y, conf) for reference pose
-            
+            keypoint_pairs: List of (keypoints_current, keypoints_ref) arrays of (x, y, conf) rows
+
         Returns:
-            affine_matrix: 2x3 affine transformation matrix, or None if insufficient points
+            List with a 2x3 affine transformation matrix per pair, or None if insufficient points
         """
-        # Find keypoints that exist in both current and reference
-        src_points = []
-        dst_points = []
-        
-        for i in range(min(len(keypoints_current), len(keypoints_ref))):
-            x_cur, y_cur, c_cur = keypoints_current[i]
-            x_ref, y_ref, c_ref = keypoints_ref[i]
-            
-            # Use keypoints that exist in reference (high confidence)
-            if c_ref > 0.3 and not self._is_keypoint_missing(x_ref, y_ref, c_ref):
-                # If current keypoint exists, use it as target
-                if c_cur > 0.3 and not self._is_keypoint_missing(x_cur, y_cur, c_cur):
-                    src_points.append([x_ref, y_ref])
-                    dst_points.append([x_cur, y_cur])
-        
-        if len(src_points) < 3:
-            # Not enough points to estimate transformation
-            return None
-        
-        src_points = np.array(src_points, dtype=np.float32)
-        dst_points = np.array(dst_points, dtype=np.float32)
-        
-        # Estimate affine transformation
-        affine_matrix = cv2.getAffineTransform(src_points[:3], dst_points[:3]) if len(src_points) >= 3 else None
-        
-        # For better results with more points, use least squares
-        if len(src_points) > 3:
-            try:
-                # Fit affine using more points
-                A = np.vstack([src_points.T, np.ones(len(src_points))])
-                b_x = dst_points[:, 0]
-                b_y = dst_points[:, 1]
-                
-                # Solve for transformation matrix
-                # [a b tx] * [x]   [x']
-                # [c d ty]   [y] = [y']
-                #            [1]
-                coeff_x = np.linalg.lstsq(A.T, b_x, rcond=None)[0]
-                coeff_y = np.linalg.lstsq(A.T, b_y, rcond=None)[0]
-                
-                affine_matrix = np.array([coeff_x, coeff_y], dtype=np.float32)
-            except:
-                pass
-        
-        return affine_matrix
-
-    def _transform_point(self, point, affine_matrix):
-        """Apply affine transformation to a point"""
-        if affine_matrix is None:
-            return point
-        
-        x, y = point
-        # affine_matrix is 2x3: [[a, b, tx], [c, d, ty]]
-        x_new = affine_matrix[0, 0] * x + affine_matrix[0, 1] * y + affine_matrix[0, 2]
-        y_new = affine_matrix[1, 0] * x + affine_matrix[1, 1] * y + affine_matrix[1, 2]
-        return (x_new, y_new)
-
-    def _restore_keypoints_relative(self, keypoints_current, keypoints_ref, hierarchy, 
+        affine_matrices = [None] * len(keypoint_pairs)
+        fitted = []
+        normal_matrices = []
+        rhs_matrices = []
+
+        for pair_idx, (keypoints_current, keypoints_ref) in enumerate(keypoint_pairs):
+            # Use keypoints that exist (high confidence) in both reference and current pose.
+            # A confident keypoint can never be the all-zero missing marker, so no zero check is needed.
+            n = min(len(keypoints_current), len(keypoints_ref))
+            both = (keypoints_ref[:n, 2] > 0.3) & (keypoints_current[:n, 2] > 0.3)
+            if np.count_nonzero(both) < 3:
+                # Not enough points to estimate transformation
+                continue
+
+            src_points = keypoints_ref[:n][both, :2].astype(np.float32)
+            dst_points = keypoints_current[:n][both, :2].astype(np.float32)
+
+            # Normal equations of the homogeneous system:
+            # [a b tx] * [x]   [x']
+            # [c d ty]   [y] = [y']
+            #            [1]
+            # With P = [x; y; 1] of shape (3, N): A^T = (P P^T)^-1 P dst
+            P = np.empty((3, len(src_points)))
+            P[:2] = src_points.T
+            P[2] = 1.0
+            fitted.append(pair_idx)
+            normal_matrices.append(P @ P.T)
+            rhs_matrices.append(P @ dst_points)
+
+        if not fitted:
+            return affine_matrices
+
+        try:
+            coeffs = np.linalg.solve(np.stack(normal_matrices), np.stack(rhs_matrices))
+        except np.linalg.LinAlgError:
+            # A degenerate (e.g. collinear) region fails the whole batch; solve them one by one
+            coeffs = []
+            for normal, rhs in zip(normal_matrices, rhs_matrices):
+                try:
+                    coeffs.append(np.linalg.solve(normal, rhs))
+                except np.linalg.LinAlgError:
+                    coeffs.append(None)
+
+        for pair_idx, coeff in zip(fitted, coeffs):
+            if coeff is not None:
+                affine_matrices[pair_idx] = coeff.T.astype(np.float32)
+        return affine_matrices
+
+    def _restore_keypoints_relative(self, keypoints_current, keypoints_ref, hierarchy, affine_matrix,
                                    reduce_confidence=True, confidence_factor=0.7):
         """
         Restore missing keypoints using relative hierarchy and affine transformation.
-        
+        Callers pre-filter regions with _needs_restoration, which holds the restorability rule.
+
         Args:
-            keypoints_current: List of (x, y, conf) for current pose
-            keypoints_ref: List of (x, y, conf) for reference pose
-            hierarchy: Dict mapping child_idx -> parent_idx
+            keypoints_current: (N, 3) array of (x, y, conf) for current pose
+            keypoints_ref: (M, 3) array of (x, y, conf) for reference pose
+            hierarchy: Depth levels of (child_idx, parent_idx) index arrays, parents first
+            affine_matrix: 2x3 reference-to-current affine, or None to use raw offsets
             reduce_confidence: Whether to reduce confidence of restored keypoints
             confidence_factor: Factor to multiply confidence (0.0-1.0)
-            
+
         Returns:
-            Restored keypoints list
+            Restored (N, 3) keypoints array
         """
-        if keypoints_ref is None:
-            return keypoints_current
-        
-        restored = copy.deepcopy(keypoints_current)
-        
-        # Estimate affine transformation
-        affine_matrix = self._estimate_affine_transform(keypoints_current, keypoints_ref)
-        
-        # Process each keypoint
-        for child_idx, parent_idx in hierarchy.items():
-            if child_idx >= len(restored):
-                continue
-            
-            x_child, y_child, c_child = restored[child_idx]
-            
-            # Skip if keypoint already exists
-            if not self._is_keypoint_missing(x_child, y_child, c_child):
+        # Missing keypoints are all-zero rows; compute the masks once per region
+        missing = ~keypoints_current.any(axis=1)
+        missing_ref = ~keypoints_ref.any(axis=1)
+        n = min(len(keypoints_current), len(keypoints_ref))
+
+        restored = keypoints_current.copy()
+
+        # Offsets only need the linear (rotation + scale) part of the affine; translation
+        # cancels between child and parent. Transposed once for row-vector offsets.
+        linear_t = affine_matrix[:, :2].T if affine_matrix is not None else None
+
+        # Walk the hierarchy level by level so restored parents can seed their own children
+        for child_idx, parent_idx in hierarchy:
+            # Parent/child index pairs, limited to rows present in both arrays
+            in_range = (child_idx < n) & (parent_idx < n)
+            child_idx, parent_idx = child_idx[in_range], parent_idx[in_range]
+
+            # Restore a child only if it is missing, its parent exists (or was just restored)
+            # and the child exists in the reference
+            restorable = missing[child_idx] & ~missing[parent_idx] & ~missing_ref[child_idx]
+            child_idx, parent_idx = child_idx[restorable], parent_idx[restorable]
+            if not child_idx.size:
                 continue
-            
-            # Try to restore from parent
-            if parent_idx < len(keypoints_current) and parent_idx < len(keypoints_ref):
-                x_parent_cur, y_parent_cur, c_parent_cur = keypoints_current[parent_idx]
-                x_parent_ref, y_parent_ref, c_parent_ref = keypoints_ref[parent_idx]
-                
-                # Parent must exist in current pose
-                if self._is_keypoint_missing(x_parent_cur, y_parent_cur, c_parent_cur):
-                    continue
-                
-                # Get offset in reference
-                x_child_ref, y_child_ref, c_child_ref = keypoints_ref[child_idx]
-                
-                if not self._is_keypoint_missing(x_child_ref, y_child_ref, c_child_ref):
-                    # Calculate offset vector in reference
-                    offset_x = x_child_ref - x_parent_ref
-                    offset_y = y_child_ref - y_parent_ref
-                    
-                    # Transform offset using affine matrix
-                    if affine_matrix is not None:
-                        # Apply rotation and scaling to offset
-                        offset_transformed = self._transform_point((offset_x, offset_y), affine_matrix)
-                        # Remove translation component
-                        offset_transformed = (
-                            offset_transformed[0] - affine_matrix[0, 2],
-                            offset_transformed[1] - affine_matrix[1, 2]
-                        )
-                    else:
-                        offset_transformed = (offset_x, offset_y)
-                    
-                    # Apply to current parent position
-                    x_restored = float(x_parent_cur + offset_transformed[0])
-                    y_restored = float(y_parent_cur + offset_transformed[1])
-                    
-                    # Use parent's confidence or reference's confidence, then optionally reduce
-                    c_restored = float(min(c_parent_cur, c_child_ref))
-                    if reduce_confidence:
-                        c_restored = float(c_restored * confidence_factor)
-                    
-                    restored[child_idx] = [x_restored, y_restored, c_restored]
-                    print(f"  Restored keypoint {child_idx} from parent {parent_idx}: ({x_restored:.2f}, {y_restored:.2f}, {c_restored:.3f})")
-        
+
+            # Offset vectors in reference, rotated and scaled by the linear part of the affine
+            offsets = keypoints_ref[child_idx, :2] - keypoints_ref[parent_idx, :2]
+            if linear_t is not None:
+                offsets = offsets @ linear_t
+
+            # Apply to parent positions
+            restored[child_idx, :2] = restored[parent_idx, :2] + offsets
+
+            # Use parent's confidence or reference's confidence, then optionally reduce
+            confidence = np.minimum(restored[parent_idx, 2], keypoints_ref[child_idx, 2])
+            if reduce_confidence:
+                confidence *= confidence_factor
+            restored[child_idx, 2] = confidence
+            missing[child_idx] = False
+
+            if DEBUG:
+                for child, parent in zip(child_idx.tolist(), parent_idx.tolist()):
+                    x_restored, y_restored, c_restored = restored[child]
+                    print(f"  Restored keypoint {child} from parent {parent}: ({x_restored:.2f}, {y_restored:.2f}, {c_restored:.3f})")
+
         return restored
 
-    def dwrestore(self, pose_keypoints, ref_pose=None, reduce_confidence=True, confidence_reduction_factor=0.7, use_gpu=False):
-        print(f"\n=== DwRestorator: Relative Restoration ===")
-        print(f"pose_keypoints type: {type(pose_keypoints)}")
-        print(f"ref_pose type: {type(ref_pose)}")
-        print(f"reduce_confidence: {reduce_confidence}, factor: {confidence_reduction_factor}")
-        
+    def _needs_restoration(self, keypoints_current, keypoints_ref, hierarchy):
+        """
+        Mask-only check whether restoring a region would change any keypoint.
+        For a hierarchy, some missing child must have an existing parent and an existing
+        reference keypoint (any chained restoration starts from such a pair). For the face,
+        some missing keypoint must exist in the reference and at least one anchor must exist.
+        """
+        missing_cur = ~keypoints_current.any(axis=1)
+        if not missing_cur.any():
+            return False
+        n = min(len(keypoints_current), len(keypoints_ref))
+        missing_cur = missing_cur[:n]
+        missing_ref = ~keypoints_ref[:n].any(axis=1)
+        if hierarchy is None:
+            return bool((missing_cur & ~missing_ref).any() and (keypoints_current[:n, 2] > 0.3).any())
+        for child_idx, parent_idx in hierarchy:
+            in_range = (child_idx < n) & (parent_idx < n)
+            child_idx, parent_idx = child_idx[in_range], parent_idx[in_range]
+            if (missing_cur[child_idx] & ~missing_cur[parent_idx] & ~missing_ref[child_idx]).any():
+                return True
+        return False
+
+    def _restore_person(self, pin, pref, reduce_confidence=True, confidence_factor=0.7):
+        """
+        Restore every keypoint region of one person dict in place against a reference person dict.
+        Only the flat keypoint lists of pin are modified.
+        """
+        regions = []
+        for key, hierarchy, label in RESTORE_REGIONS:
+            flat_in = pin.get(key)
+            flat_ref = pref.get(key)
+            if not isinstance(flat_in, list) or len(flat_in) < 3:
+                continue
+            if not isinstance(flat_ref, list) or len(flat_ref) < 3:
+                continue
+
+            # Convert flat lists to (N, 3) arrays of (x, y, conf) rows
+            keypoints_current = _as_kp_array(flat_in)
+            keypoints_ref_list = self._get_ref_keypoints(key, flat_ref)
+
+            # Regions with nothing restorable skip the affine fit and restoration entirely
+            if not self._needs_restoration(keypoints_current, keypoints_ref_list, hierarchy):
+                continue
+            regions.append((hierarchy, label, flat_in, keypoints_current, keypoints_ref_list))
+
+        # Fit the affines of all regions that need restoring in one batched solve
+        affine_matrices = self._estimate_affine_transforms(
+            [(keypoints_current, keypoints_ref_list) for _, _, _, keypoints_current, keypoints_ref_list in regions]
+        )
+
+        for (hierarchy, label, flat_in, keypoints_current, keypoints_ref_list), affine_matrix in zip(regions, affine_matrices):
+            if DEBUG:
+                print(f"\n--- Restoring {label} Keypoints ---")
+
+            if hierarchy is None:
+                # Face keypoints (simplified local hierarchy)
+                restored = self._restore_face_keypoints(
+                    keypoints_current, keypoints_ref_list, affine_matrix,
+                    reduce_confidence, confidence_factor
+                )
+            else:
+                restored = self._restore_keypoints_relative(
+                    keypoints_current, keypoints_ref_list, hierarchy, affine_matrix,
+                    reduce_confidence, confidence_factor
+                )
+
+            # Write only the restored triplets back into the (already copied) flat list
+            restored_count = self._write_restored_triplets(flat_in, keypoints_current, restored)
+            if restored_count:
+                print(f"  {label}: restored {restored_count} keypoint(s)")
+
+    def dwrestore(self, pose_keypoints, ref_pose=None, reduce_confidence=True, confidence_reduction_factor=0.7, use_gpu=False,
+                  render_image=True):
+        if DEBUG:
+            print(f"\n=== DwRestorator: Relative Restoration ===")
+            print(f"pose_keypoints type: {type(pose_keypoints)}")
+            print(f"ref_pose type: {type(ref_pose)}")
+            print(f"reduce_confidence: {reduce_confidence}, factor: {confidence_reduction_factor}")
+
         if ref_pose is None:
             print("ERROR: ref_pose is None, returning unchanged")
             return (self._create_blank_image(), pose_keypoints)
 
-        out = copy.deepcopy(pose_keypoints)
+        out = self._clone_pose(pose_keypoints)
         ref = ref_pose
 
-        def get_person0(x):
-            # x may be a top-level dict containing "people": [...]
-            if isinstance(x, dict) and "people" in x and isinstance(x["people"], list) and x["people"]:
-                return x["people"][0], "dict_people0"
-
-            # x may be a list. It can be either:
-            # - a list of person dicts (people list) -> [ {pose..}, ... ]
-            # - a list containing a top-level dict like {"people": [ {...} ], ...}
-            if isinstance(x, list) and x:
-                first = x[0]
-                # list contains a top-level dict with "people"
-                if isinstance(first, dict) and "people" in first and isinstance(first["people"], list) and first["people"]:
-                    return first["people"][0], "list_topdict_people0"
-                # list directly contains person dict(s)
-                if isinstance(first, dict) and ("pose_keypoints_2d" in first or "face_keypoints_2d" in first or "hand_left_keypoints_2d" in first or "hand_right_keypoints_2d" in first):
-                    return first, "list_people0"
-
-            raise TypeError(f"Unsupported POSE_KEYPOINT structure: {type(x)}")
-
-        try:
-            pin, mode_in = get_person0(out)
-            pref, mode_ref = get_person0(ref)
+        pin = get_person0(out)
+        pref = get_person0(ref)
+        if pin is None or pref is None:
+            unsupported = out if pin is None else ref
+            print(f"ERROR extracting person data: Unsupported POSE_KEYPOINT structure: {type(unsupported)}")
+            return (self._create_blank_image(), out)
+        canvas_h, canvas_w = self._get_canvas_dims(out)
+        if DEBUG:
             print(f"Extracted person dicts successfully")
             print(f"Input person keys: {list(pin.keys())}")
             print(f"Reference person keys: {list(pref.keys())}")
-        except Exception as e:
-            print(f"ERROR extracting person data: {e}")
-            return (self._create_blank_image(), out)
 
-        # Restore body keypoints
-        print(f"\n--- Restoring Body Keypoints ---")
-        pose_in = pin.get("pose_keypoints_2d", None)
-        pose_ref = pref.get("pose_keypoints_2d", None)
-        
-        if pose_in and isinstance(pose_in, list) and len(pose_in) >= 3:
-            # Convert flat list to (x, y, conf) tuples
-            keypoints_current = [(pose_in[i], pose_in[i+1], pose_in[i+2]) for i in range(0, len(pose_in)-2, 3)]
-            keypoints_ref_list = None
-            if pose_ref and isinstance(pose_ref, list) and len(pose_ref) >= 3:
-                keypoints_ref_list = [(pose_ref[i], pose_ref[i+1], pose_ref[i+2]) for i in range(0, len(pose_ref)-2, 3)]
-            
-            restored_body = self._restore_keypoints_relative(
-                keypoints_current, keypoints_ref_list, BODY_HIERARCHY,
-                reduce_confidence, confidence_reduction_factor
-            )
-            
-            # Convert back to flat list with native Python floats
-            pose_in_new = []
-            for x, y, c in restored_body:
-                pose_in_new.extend([float(x), float(y), float(c)])
-            pin["pose_keypoints_2d"] = pose_in_new
-
-        # Restore left hand keypoints
-        print(f"\n--- Restoring Left Hand Keypoints ---")
-        hand_left_in = pin.get("hand_left_keypoints_2d", None)
-        hand_left_ref = pref.get("hand_left_keypoints_2d", None)
-        
-        if hand_left_in and isinstance(hand_left_in, list) and len(hand_left_in) >= 3:
-            keypoints_current = [(hand_left_in[i], hand_left_in[i+1], hand_left_in[i+2]) for i in range(0, len(hand_left_in)-2, 3)]
-            keypoints_ref_list = None
-            if hand_left_ref and isinstance(hand_left_ref, list) and len(hand_left_ref) >= 3:
-                keypoints_ref_list = [(hand_left_ref[i], hand_left_ref[i+1], hand_left_ref[i+2]) for i in range(0, len(hand_left_ref)-2, 3)]
-            
-            restored_hand = self._restore_keypoints_relative(
-                keypoints_current, keypoints_ref_list, HAND_HIERARCHY,
-                reduce_confidence, confidence_reduction_factor
-            )
-            
-            hand_left_in_new = []
-            for x, y, c in restored_hand:
-                hand_left_in_new.extend([float(x), float(y), float(c)])
-            pin["hand_left_keypoints_2d"] = hand_left_in_new
-
-        # Restore right hand keypoints
-        print(f"\n--- Restoring Right Hand Keypoints ---")
-        hand_right_in = pin.get("hand_right_keypoints_2d", None)
-        hand_right_ref = pref.get("hand_right_keypoints_2d", None)
-        
-        if hand_right_in and isinstance(hand_right_in, list) and len(hand_right_in) >= 3:
-            keypoints_current = [(hand_right_in[i], hand_right_in[i+1], hand_right_in[i+2]) for i in range(0, len(hand_right_in)-2, 3)]
-            keypoints_ref_list = None
-            if hand_right_ref and isinstance(hand_right_ref, list) and len(hand_right_ref) >= 3:
-                keypoints_ref_list = [(hand_right_ref[i], hand_right_ref[i+1], hand_right_ref[i+2]) for i in range(0, len(hand_right_ref)-2, 3)]
-            
-            restored_hand = self._restore_keypoints_relative(
-                keypoints_current, keypoints_ref_list, HAND_HIERARCHY,
-                reduce_confidence, confidence_reduction_factor
-            )
-            
-            hand_right_in_new = []
-            for x, y, c in restored_hand:
-                hand_right_in_new.extend([float(x), float(y), float(c)])
-            pin["hand_right_keypoints_2d"] = hand_right_in_new
-
-        # Restore face keypoints (simplified local hierarchy)
-        print(f"\n--- Restoring Face Keypoints ---")
-        face_in = pin.get("face_keypoints_2d", None)
-        face_ref = pref.get("face_keypoints_2d", None)
-        
-        if face_in and isinstance(face_in, list) and len(face_in) >= 3:
-            keypoints_current = [(face_in[i], face_in[i+1], face_in[i+2]) for i in range(0, len(face_in)-2, 3)]
-            keypoints_ref_list = None
-            if face_ref and isinstance(face_ref, list) and len(face_ref) >= 3:
-                keypoints_ref_list = [(face_ref[i], face_ref[i+1], face_ref[i+2]) for i in range(0, len(face_ref)-2, 3)]
-            
-            restored_face = self._restore_face_keypoints(
-                keypoints_current, keypoints_ref_list,
-                reduce_confidence, confidence_reduction_factor
-            )
-            
-            face_in_new = []
-            for x, y, c in restored_face:
-                face_in_new.extend([float(x), float(y), float(c)])
-            pin["face_keypoints_2d"] = face_in_new
-
-        print(f"=== Restoration complete ===\n")
-        
+        self._restore_person(pin, pref, reduce_confidence, confidence_reduction_factor)
+
+        if DEBUG:
+            print(f"=== Restoration complete ===\n")
+
         # After restoration, prepare exported pose where out-of-canvas keypoints are zeroed
-        out_for_export = copy.deepcopy(out)
-        canvas_h, canvas_w = self._get_canvas_dims(out_for_export)
-        self._zero_out_of_canvas(out_for_export, canvas_h, canvas_w)
-        
-        # Convert all numeric types to native Python types for JSON serialization
-        out_for_export = convert_to_python_types(out_for_export)
+        out_for_export = self._clone_pose(out)
+        person_export = get_person0(out_for_export)
+        self._zero_out_of_canvas(person_export, canvas_h, canvas_w)
+
+        # Convert the restored keypoint lists to native Python floats for JSON serialization
+        self._jsonify_person(person_export)
 
         # Generate image output (visualization uses zeroed copy internally)
-        image_output = self._generate_pose_image(out, use_gpu=use_gpu)
+        if render_image:
+            image_output = self._generate_pose_image(out, canvas_h, canvas_w, use_gpu=use_gpu)
+        else:
+            # pose_image is not needed downstream: skip decoding and drawing entirely
+            image_output = self._create_blank_image(canvas_w, canvas_h)
 
         return (image_output, out_for_export,)
 
-    def _restore_face_keypoints(self, keypoints_current, keypoints_ref, 
+    def _restore_face_keypoints(self, keypoints_current, keypoints_ref, affine_matrix,
                                reduce_confidence=True, confidence_factor=0.7):
         """
         Restore face keypoints using simple local hierarchy approach.
-        Uses face center (nose) as anchor for nearby regions.
+        Uses the nearest confident face keypoint as anchor for each missing one.
+        Callers pre-filter regions with _needs_restoration, so targets and anchors are never empty.
         """
-        if keypoints_ref is None:
-            return keypoints_current
-        
-        restored = copy.deepcopy(keypoints_current)
-        
-        # Estimate affine transformation from existing face keypoints
-        affine_matrix = self._estimate_affine_transform(keypoints_current, keypoints_ref)
-        
-        # Find face center (approximate center of existing keypoints)
-        existing_points = []
-        for i, (x, y, c) in enumerate(keypoints_current):
-            if c > 0.3 and not self._is_keypoint_missing(x, y, c):
-                existing_points.append((x, y))
-        
-        if existing_points:
-            face_center = (
-                np.mean([p[0] for p in existing_points]),
-                np.mean([p[1] for p in existing_points])
-            )
-        else:
-            face_center = None
-        
-        # Restore missing face keypoints
-        for i in range(len(restored)):
-            x, y, c = restored[i]
-            
-            if self._is_keypoint_missing(x, y, c):
-                # Try to restore from reference
-                if i < len(keypoints_ref):
-                    x_ref, y_ref, c_ref = keypoints_ref[i]
-                    if not self._is_keypoint_missing(x_ref, y_ref, c_ref):
-                        # Find closest existing keypoint to use as anchor
-                        closest_idx = None
-                        min_dist = float('inf')
-                        
-                        for j in range(len(keypoints_current)):
-                            x_j, y_j, c_j = keypoints_current[j]
-                            if c_j > 0.3 and not self._is_keypoint_missing(x_j, y_j, c_j):
-                                dist = (x_ref - x_j) ** 2 + (y_ref - y_j) ** 2
-                                if dist < min_dist:
-                                    min_dist = dist
-                                    closest_idx = j
-                        
-                        if closest_idx is not None:
-                            x_anchor, y_anchor, c_anchor = keypoints_current[closest_idx]
-                            x_anchor_ref, y_anchor_ref, c_anchor_ref = keypoints_ref[closest_idx]
-                            
-                            # Calculate offset in reference
-                            offset_x = x_ref - x_anchor_ref
-                            offset_y = y_ref - y_anchor_ref
-                            
-                            # Transform offset
-                            if affine_matrix is not None:
-                                offset_transformed = self._transform_point((offset_x, offset_y), affine_matrix)
-                                offset_transformed = (
-                                    offset_transformed[0] - affine_matrix[0, 2],
-                                    offset_transformed[1] - affine_matrix[1, 2]
-                                )
-                            else:
-                                offset_transformed = (offset_x, offset_y)
-                            
-                            x_restored = float(x_anchor + offset_transformed[0])
-                            y_restored = float(y_anchor + offset_transformed[1])
-                            c_restored = float(c_ref)
-                            if reduce_confidence:
-                                c_restored = float(c_restored * confidence_factor)
-                            
-                            restored[i] = [x_restored, y_restored, c_restored]
-                            print(f"  Restored face keypoint {i} from anchor {closest_idx}: ({x_restored:.2f}, {y_restored:.2f}, {c_restored:.3f})")
-        
+        # Missing keypoints are all-zero rows; confident keypoints (conf > 0.3) serve as anchors
+        missing_cur = ~keypoints_current.any(axis=1)
+        n = min(len(keypoints_current), len(keypoints_ref))
+        missing_ref = ~keypoints_ref[:n].any(axis=1)
+        anchor_idx = np.flatnonzero(keypoints_current[:n, 2] > 0.3)
+
+        # Restore missing keypoints that exist in the reference
+        target_idx = np.flatnonzero(missing_cur[:n] & ~missing_ref)
+
+        restored = keypoints_current.copy()
+
+        # Closest existing keypoint to each reference position, used as anchor
+        diff = keypoints_ref[target_idx, None, :2] - keypoints_current[None, anchor_idx, :2]
+        closest_idx = anchor_idx[np.argmin((diff ** 2).sum(axis=-1), axis=1)]
+
+        # Offsets from anchor in reference, rotated and scaled by the linear part of the affine
+        offsets = keypoints_ref[target_idx, :2] - keypoints_ref[closest_idx, :2]
+        if affine_matrix is not None:
+            offsets = offsets @ affine_matrix[:, :2].T
+
+        restored[target_idx, :2] = keypoints_current[closest_idx, :2] + offsets
+        confidence = keypoints_ref[target_idx, 2]
+        if reduce_confidence:
+            confidence *= confidence_factor
+        restored[target_idx, 2] = confidence
+
+        if DEBUG:
+            for i, anchor in zip(target_idx.tolist(), closest_idx.tolist()):
+                x_restored, y_restored, c_restored = restored[i]
+                print(f"  Restored face keypoint {i} from anchor {anchor}: ({x_restored:.2f}, {y_restored:.2f}, {c_restored:.3f})")
+
         return restored
 
+    def _get_ref_keypoints(self, key, flat_ref):
+        """
+        Return the (N, 3) array for a reference keypoint list, reusing the previous conversion.
+        Video workflows pass the same ref_pose for every frame, so the list is compared with a
+        snapshot of the values last converted for that key and only parsed again when they differ.
+        Comparing contents rather than identity also catches lists edited in place.
+        """
+        cached = self._ref_arrays.get(key)
+        if cached is not None and cached[0] == flat_ref:
+            return cached[1]
+        keypoints_ref = _as_kp_array(flat_ref)
+        keypoints_ref.flags.writeable = False
+        self._ref_arrays[key] = (list(flat_ref), keypoints_ref)
+        return keypoints_ref
+
+    def _clone_pose(self, pose_data):
+        """
+        Copy the parts of a POSE_KEYPOINT structure that restoration mutates.
+        Dicts, the people list and the flat keypoint lists are duplicated; all other values are shared.
+        """
+        if isinstance(pose_data, list):
+            return [self._clone_pose(item) for item in pose_data]
+        if isinstance(pose_data, dict):
+            clone = dict(pose_data)
+            if isinstance(clone.get("people"), list):
+                clone["people"] = [self._clone_pose(person) for person in clone["people"]]
+            for key in KEYPOINT_KEYS:
+                if isinstance(clone.get(key), list):
+                    clone[key] = list(clone[key])
+            return clone
+        return pose_data
+
+    def _write_restored_triplets(self, flat_keypoints, keypoints_before, keypoints_after):
+        """
+        Copy restored (x, y, conf) rows back into a flat keypoint list in place.
+        Only rows that changed are written, so untouched keypoints keep their original objects.
+        Returns the number of rows written.
+        """
+        changed = np.flatnonzero((keypoints_after != keypoints_before).any(axis=1))
+        for idx in changed.tolist():
+            flat_keypoints[3 * idx:3 * idx + 3] = _from_kp_array(keypoints_after[idx])
+        return len(changed)
+
+    def _jsonify_person(self, person):
+        """
+        Make the flat keypoint lists of a person dict JSON-serializable in place.
+        These are the only values restoration writes, so the rest of the pose is left as is.
+        """
+        for key in KEYPOINT_KEYS:
+            if isinstance(person.get(key), list):
+                person[key] = np.asarray(person[key], dtype=np.float64).tolist()
 
-    def _zero_out_of_canvas(self, pose_data, canvas_height, canvas_width):
+    def _zero_out_of_canvas(self, person, canvas_height, canvas_width):
         """
-        Zero-out keypoints that are outside the canvas bounds for visualization and exported output.
-        This preserves internal coordinates for calculations (use on a copy when needed).
+        Zero-out keypoints of a person dict that are outside the canvas bounds for visualization
+        and exported output. This preserves internal coordinates for calculations (use on a copy when needed).
         """
         try:
-            def get_person0(x):
-                if isinstance(x, dict) and "people" in x and isinstance(x["people"], list) and x["people"]:
-                    return x["people"][0]
-                if isinstance(x, list) and x:
-                    first = x[0]
-                    if isinstance(first, dict) and "people" in first and isinstance(first["people"], list) and first["people"]:
-                        return first["people"][0]
-                    if isinstance(first, dict) and ("pose_keypoints_2d" in first or "face_keypoints_2d" in first):
-                        return first
-                return None
-
-            person = get_person0(pose_data)
             if person is None:
                 return
 
-            # Body keypoints
-            if "pose_keypoints_2d" in person and isinstance(person["pose_keypoints_2d"], list):
-                kpts = person["pose_keypoints_2d"]
-                for i in range(0, len(kpts) - 2, 3):
-                    x, y = kpts[i], kpts[i+1]
-                    if x < 0 or x >= canvas_width or y < 0 or y >= canvas_height:
-                        kpts[i], kpts[i+1], kpts[i+2] = 0.0, 0.0, 0.0
-
-            # Hand keypoints
-            for hand_key in ["hand_left_keypoints_2d", "hand_right_keypoints_2d"]:
-                if hand_key in person and isinstance(person[hand_key], list):
-                    kpts = person[hand_key]
-                    for i in range(0, len(kpts) - 2, 3):
-                        x, y = kpts[i], kpts[i+1]
-                        if x < 0 or x >= canvas_width or y < 0 or y >= canvas_height:
-                            kpts[i], kpts[i+1], kpts[i+2] = 0.0, 0.0, 0.0
-
-            # Face keypoints
-            if "face_keypoints_2d" in person and isinstance(person["face_keypoints_2d"], list):
-                kpts = person["face_keypoints_2d"]
-                for i in range(0, len(kpts) - 2, 3):
-                    x, y = kpts[i], kpts[i+1]
-                    if x < 0 or x >= canvas_width or y < 0 or y >= canvas_height:
-                        kpts[i], kpts[i+1], kpts[i+2] = 0.0, 0.0, 0.0
+            # Check body, face and both hands in one batch of (x, y, conf) rows
+            regions = [person[key] for key in KEYPOINT_KEYS if isinstance(person.get(key), list)]
+            if not regions:
+                return
+            arrays = [_as_kp_array(kpts) for kpts in regions]
+            counts = [len(kpts) for kpts in arrays]
+            keypoints = np.concatenate(arrays)
+            x, y = keypoints[:, 0], keypoints[:, 1]
+            outside = (x < 0) | (x >= canvas_width) | (y < 0) | (y >= canvas_height)
+
+            # Split the mask back per region and zero the flagged triplets in place
+            offset = 0
+            for kpts, n in zip(regions, counts):
+                for i in np.flatnonzero(outside[offset:offset + n]).tolist():
+                    kpts[3 * i:3 * i + 3] = [0.0, 0.0, 0.0]
+                offset += n
         except Exception as e:
             print(f"WARNING: Error zeroing out-of-canvas keypoints: {e}")
 
@@ -539,51 +581,79 @@ class DwRestorator:
             return pose_data.get("canvas_height", 512), pose_data.get("canvas_width", 512)
         return 512, 512
 
-    def _generate_pose_image(self, pose_data, use_gpu=False):
+    def _generate_pose_image(self, pose_data, canvas_height, canvas_width, use_gpu=False):
         """
         Generate an image visualization from pose data.
-        Out-of-canvas keypoints are zeroed out in a visualization copy before drawing.
+        Out-of-canvas keypoints are zeroed out in visualization arrays before drawing.
         """
-        print(f"\n=== Generating Pose Image ===")
+        if DEBUG:
+            print(f"\n=== Generating Pose Image ===")
 
         if not DWPOSE_AVAILABLE:
             print("WARNING: DWPose not available, returning blank image")
             return self._create_blank_image()
 
         try:
-            # Extract canvas dimensions and pose data
-            canvas_height, canvas_width = self._get_canvas_dims(pose_data)
-            print(f"Canvas size: {canvas_width}x{canvas_height}")
-
-            # Create a copy for visualization to avoid modifying original
-            visualization_data = copy.deepcopy(pose_data)
-
-            # Zero-out out-of-canvas keypoints in visualization copy
-            self._zero_out_of_canvas(visualization_data, canvas_height, canvas_width)
-
-            # Decode poses from JSON format
-            poses, _, _, _ = decode_json_as_poses(visualization_data[0] if isinstance(visualization_data, list) else visualization_data)
-            print(f"Decoded {len(poses)} poses from data")
-
-            # Draw poses on canvas (skips missing keypoints because they are zeroed)
+            if DEBUG:
+                print(f"Canvas size: {canvas_width}x{canvas_height}")
+
+            # Reuse the previous image when nothing that gets drawn has changed
+            device = 'cuda' if (use_gpu and _cuda_available()) else 'cpu'
+            image_key = self._pose_image_key(pose_data, canvas_height, canvas_width, device)
+            if image_key is not None and image_key == self._last_image_key:
+                if DEBUG:
+                    print("Pose unchanged since last frame, reusing image")
+                # Hand out a copy so in-place ops downstream cannot reach the cached image
+                return self._last_image.clone()
+
+            # Parse the drawn keypoints into fresh arrays with out-of-canvas rows zeroed
+            people_arrays = self._visible_keypoint_arrays(pose_data, canvas_height, canvas_width)
+            if decode_arrays_as_poses is not None:
+                # Feed parsed arrays straight to the drawer
+                poses = decode_arrays_as_poses(people_arrays)
+            else:
+                # controlnet_aux only decodes flat lists: hand it a minimal pose dict
+                poses, _, _, _ = decode_json_as_poses({
+                    "people": [
+                        {key: _from_kp_array(keypoints) for key, keypoints in person.items()}
+                        for person in people_arrays
+                    ],
+                    "canvas_height": canvas_height,
+                    "canvas_width": canvas_width,
+                })
+            if DEBUG:
+                print(f"Decoded {len(poses)} poses from data")
+
+            # Draw poses on canvas (skips missing keypoints because they are zeroed).
+            # The local module can draw into our reused buffer; controlnet_aux allocates its own.
+            draw_kwargs = {}
+            if decode_arrays_as_poses is not None:
+                if self._canvas is None or self._canvas.shape != (canvas_height, canvas_width, 3):
+                    self._canvas = np.empty((canvas_height, canvas_width, 3), dtype=np.uint8)
+                draw_kwargs["out"] = self._canvas
             canvas = draw_poses(
                 poses,
                 canvas_height,
                 canvas_width,
                 draw_body=True,
                 draw_hand=True,
-                draw_face=True
+                draw_face=True,
+                **draw_kwargs
             )
-            print(f"Drew poses on canvas")
-
-            # Convert numpy array to torch tensor format (normalize to 0-1)
-            image_tensor = canvas.astype(np.float32) / 255.0
-            image_tensor = np.expand_dims(image_tensor, axis=0)  # Add batch dimension
-            device = 'cuda' if (use_gpu and torch.cuda.is_available()) else 'cpu'
-            image_tensor = torch.from_numpy(image_tensor).to(device)  # Convert to torch tensor
-
-            print(f"Converted to tensor: shape={image_tensor.shape}, dtype={image_tensor.dtype}, device={image_tensor.device}")
-            print("=== Image Generation Complete ===\n")
+            if DEBUG:
+                print(f"Drew poses on canvas")
+
+            # Convert numpy array to torch tensor format (normalize to 0-1).
+            # Move the uint8 canvas (a quarter of the float32 bytes) and normalize on the target
+            # device; true division of uint8 yields float32 in a single pass.
+            image_tensor = torch.from_numpy(canvas).to(device).unsqueeze(0).div(255.0)
+            self._last_image_key = image_key
+            self._last_image = image_tensor
+            image_tensor = image_tensor.clone()
+
+            if DEBUG:
+                print(f"Converted to tensor: shape={image_tensor.shape}, dtype={image_tensor.dtype}, device={image_tensor.device}")
+                print("=== Image Generation Complete ===\n")
             return image_tensor
 
         except Exception as e:
@@ -592,13 +662,51 @@ class DwRestorator:
             traceback.print_exc()
             return self._create_blank_image()
 
-    
+    def _pose_image_key(self, pose_data, canvas_height, canvas_width, device):
+        """
+        Build an exact cache key for the drawn image: canvas, device and the raw
+        float64 bytes of every person's keypoint lists. Returns None if the data
+        cannot be packed, which simply disables reuse for that frame.
+        """
+        people = get_people(pose_data)
+        packed = array("d")
+        lengths = []
+        try:
+            for person in people:
+                for key in KEYPOINT_KEYS:
+                    values = person.get(key) or ()
+                    packed.extend(values)
+                    lengths.append(len(values))
+        except (TypeError, AttributeError):
+            return None
+        return (canvas_height, canvas_width, device, tuple(lengths), packed.tobytes())
+
+    def _visible_keypoint_arrays(self, pose_data, canvas_height, canvas_width):
+        """
+        Parse every drawn person's keypoint lists into fresh (N, 3) arrays, zeroing
+        out-of-canvas rows so the drawer skips them like missing keypoints.
+        """
+        people_arrays = []
+        for person in get_people(pose_data):
+            person_arrays = {}
+            for key in KEYPOINT_KEYS:
+                flat = person.get(key)
+                if not flat:
+                    continue
+                keypoints = _as_kp_array(flat)
+                x, y = keypoints[:, 0], keypoints[:, 1]
+                keypoints[(x < 0) | (x >= canvas_width) | (y < 0) | (y >= canvas_height)] = 0.0
+                person_arrays[key] = keypoints
+            people_arrays.append(person_arrays)
+        return people_arrays
+
     def _create_blank_image(self, width=512, height=512):
         """Create a blank image tensor in ComfyUI format (CPU)."""
-        print(f"Creating blank image {width}x{height}")
-        # Return as torch tensor on CPU: (batch, height, width, channels) with values 0-1
-        blank = torch.zeros((1, height, width, 3), dtype=torch.float32, device='cpu')
-        return blank
+        if DEBUG:
+            print(f"Creating blank image {width}x{height}")
+        # Return as torch tensor on CPU: (batch, height, width, channels) with values 0-1.
+        # A fresh tensor per call, so downstream in-place ops cannot leak into later frames.
+        return torch.zeros((1, height, width, 3), dtype=torch.float32, device='cpu')
 
 
 NODE_CLASS_MAPPINGS = {"DWPoseRestorator": DwRestorator}
@@ -1,6 +1,8 @@
 """Minimal pose data structures for visualization."""
 from typing import NamedTuple, List, Optional
 
+import numpy as np
+
 
 class Keypoint(NamedTuple):
     x: float
@@ -13,6 +15,8 @@ class BodyResult(NamedTuple):
     keypoints: List[Optional[Keypoint]]
     total_score: float = 0.0
     total_parts: int = 0
+    # Same keypoints as an (N, 3) array of (x, y, score) rows, score <= 0 where missing
+    kp_array: Optional[np.ndarray] = None
 
 
 HandResult = List[Keypoint]
@@ -24,3 +28,7 @@ class PoseResult(NamedTuple):
     left_hand: Optional[HandResult]
     right_hand: Optional[HandResult]
     face: Optional[FaceResult]
+    # Hands and face as (N, 3) arrays of (x, y, score) rows, when decoded from arrays
+    left_hand_array: Optional[np.ndarray] = None
+    right_hand_array: Optional[np.ndarray] = None
+    face_array: Optional[np.ndarray] = None
@@ -8,67 +8,145 @@ try:
 except ImportError:
     # Fallback: define minimal type stubs if pose_types not available
     class Keypoint:
+        __slots__ = ("x", "y", "confidence")
+
         def __init__(self, x, y, c):
             self.x, self.y, self.confidence = x, y, c
-    
+
     class BodyResult:
-        def __init__(self, keypoints=None):
+        __slots__ = ("keypoints", "kp_array")
+
+        def __init__(self, keypoints=None, kp_array=None):
             self.keypoints = keypoints or []
-    
+            self.kp_array = kp_array
+
     class PoseResult:
-        def __init__(self, body=None, left_hand=None, right_hand=None, face=None):
+        __slots__ = ("body", "left_hand", "right_hand", "face",
+                     "left_hand_array", "right_hand_array", "face_array")
+
+        def __init__(self, body=None, left_hand=None, right_hand=None, face=None,
+                     left_hand_array=None, right_hand_array=None, face_array=None):
             self.body = body or BodyResult()
             self.left_hand = left_hand
             self.right_hand = right_hand
             self.face = face
+            self.left_hand_array = left_hand_array
+            self.right_hand_array = right_hand_array
+            self.face_array = face_array
+
+
+# Body limbs as 0-based (start, end) keypoint index pairs
+_LIMB_SEQ = np.array([
+    [2, 3], [2, 6], [3, 4], [4, 5],
+    [6, 7], [7, 8], [2, 9], [9, 10],
+    [10, 11], [2, 12], [12, 13], [13, 14],
+    [2, 1], [1, 15], [15, 17], [1, 16],
+    [16, 18],
+], dtype=np.int32) - 1
+
+# Limb and joint colors
+_COLORS = np.array([
+    [255, 0, 0], [255, 85, 0], [255, 170, 0], [255, 255, 0],
+    [170, 255, 0], [85, 255, 0], [0, 255, 0], [0, 255, 85],
+    [0, 255, 170], [0, 255, 255], [0, 170, 255], [0, 85, 255],
+    [0, 0, 255], [85, 0, 255], [170, 0, 255], [255, 0, 255],
+    [255, 0, 170], [255, 0, 85],
+], dtype=np.uint8)
+
+_STICKWIDTH = 4
+
+# Python-int views of the tables above, as passed to the OpenCV calls
+_LIMB_PAIRS = tuple(map(tuple, _LIMB_SEQ.tolist()))
+_COLOR_TUPLES = tuple(map(tuple, _COLORS.tolist()))
 
 
 def decode_json_as_poses(pose_json: dict) -> Tuple[List[PoseResult], List, int, int]:
     """
     Decode pose JSON to PoseResult objects.
-    
+
     Args:
         pose_json: Dict with 'people', 'canvas_height', 'canvas_width'
-    
+
     Returns:
         (poses, animals, height, width)
     """
     height = pose_json.get("canvas_height", 512)
     width = pose_json.get("canvas_width", 512)
 
-    def chunks(lst, n):
-        """Yield successive n-sized chunks from lst."""
-        for i in range(0, len(lst), n):
-            yield lst[i:i + n]
-
-    def decompress_keypoints(
-        numbers: Optional[List[float]],
-    ) -> Optional[List[Optional[Keypoint]]]:
+    def parse_keypoints(numbers: Optional[List[float]]) -> Optional[np.ndarray]:
         if not numbers:
             return None
 
         assert len(numbers) % 3 == 0
 
-        def create_keypoint(x, y, c):
-            return Keypoint(x, y, c) if c > 0 else None
-
-        return [create_keypoint(x, y, c) for x, y, c in chunks(numbers, n=3)]
+        return np.asarray(numbers, dtype=np.float64).reshape(-1, 3)
 
     poses = []
     for pose in pose_json.get("people", []):
-        body_keypoints = decompress_keypoints(pose.get("pose_keypoints_2d")) or ([None] * 18)
-        poses.append(
-            PoseResult(
-                body=BodyResult(keypoints=body_keypoints),
-                left_hand=decompress_keypoints(pose.get("hand_left_keypoints_2d")),
-                right_hand=decompress_keypoints(pose.get("hand_right_keypoints_2d")),
-                face=decompress_keypoints(pose.get("face_keypoints_2d")),
-            )
-        )
-    
+        poses.append(_pose_from_arrays(
+            parse_keypoints(pose.get("pose_keypoints_2d")),
+            parse_keypoints(pose.get("hand_left_keypoints_2d")),
+            parse_keypoints(pose.get("hand_right_keypoints_2d")),
+            parse_keypoints(pose.get("face_keypoints_2d")),
+        ))
+
     return poses, [], height, width
 
 
+def decode_arrays_as_poses(people: List[dict]) -> List[PoseResult]:
+    """
+    Build PoseResult objects from already-parsed keypoint arrays, skipping the flat-list decode.
+
+    Args:
+        people: One dict per person mapping the *_keypoints_2d keys to (N, 3) arrays of (x, y, c)
+
+    Returns:
+        List of PoseResult; rows with c <= 0 become None like in decode_json_as_poses
+    """
+    return [
+        _pose_from_arrays(
+            pose.get("pose_keypoints_2d"),
+            pose.get("hand_left_keypoints_2d"),
+            pose.get("hand_right_keypoints_2d"),
+            pose.get("face_keypoints_2d"),
+        )
+        for pose in people
+    ]
+
+
+def _pose_from_arrays(body, left_hand, right_hand, face) -> PoseResult:
+    """Build a PoseResult keeping each region's (N, 3) array next to its Keypoint list."""
+    def non_empty(keypoints):
+        return keypoints if keypoints is not None and len(keypoints) else None
+
+    return PoseResult(
+        body=_body_from_array(body),
+        left_hand=_keypoints_from_array(left_hand),
+        right_hand=_keypoints_from_array(right_hand),
+        face=_keypoints_from_array(face),
+        left_hand_array=non_empty(left_hand),
+        right_hand_array=non_empty(right_hand),
+        face_array=non_empty(face),
+    )
+
+
+def _body_from_array(keypoints: Optional[np.ndarray]) -> BodyResult:
+    """Build a BodyResult carrying both the Keypoint list and the (N, 3) array; 18 missing points if None."""
+    if keypoints is None or not len(keypoints):
+        keypoints = np.zeros((18, 3))
+    return BodyResult(keypoints=_keypoints_from_array(keypoints), kp_array=keypoints)
+
+
+def _keypoints_from_array(keypoints: Optional[np.ndarray]) -> Optional[List[Optional[Keypoint]]]:
+    """
+    Convert an (N, 3) array of (x, y, c) rows to Keypoints, with None where c <= 0.
+    Rows are unpacked through a single tolist() call instead of per-element indexing.
+    """
+    if keypoints is None or not len(keypoints):
+        return None
+    return [Keypoint(x, y, c) if c > 0 else None for x, y, c in keypoints.tolist()]
+
+
 def draw_poses(
     poses: List[PoseResult],
     H: int,
@@ -76,11 +154,12 @@ def draw_poses(
     draw_body: bool = True,
     draw_hand: bool = True,
     draw_face: bool = True,
+    out: Optional[np.ndarray] = None,
     **kwargs
 ) -> np.ndarray:
     """
     Draw poses on a canvas.
-    
+
     Args:
         poses: List of PoseResult objects
         H: Canvas height
@@ -88,70 +167,98 @@ def draw_poses(
         draw_body: Draw body keypoints
         draw_hand: Draw hand keypoints
         draw_face: Draw face keypoints
-    
+        out: Optional (H, W, 3) uint8 buffer to clear and draw into instead of allocating
+
     Returns:
-        Canvas as numpy array (H, W, 3)
+        Canvas as numpy array (H, W, 3); out itself when given
     """
-    canvas = np.zeros((H, W, 3), dtype=np.uint8)
-
-    limbSeq = [
-        [2, 3], [2, 6], [3, 4], [4, 5],
-        [6, 7], [7, 8], [2, 9], [9, 10],
-        [10, 11], [2, 12], [12, 13], [13, 14],
-        [2, 1], [1, 15], [15, 17], [1, 16],
-        [16, 18],
-    ]
-
-    colors = [
-        [255, 0, 0], [255, 85, 0], [255, 170, 0], [255, 255, 0],
-        [170, 255, 0], [85, 255, 0], [0, 255, 0], [0, 255, 85],
-        [0, 255, 170], [0, 255, 255], [0, 170, 255], [0, 85, 255],
-        [0, 0, 255], [85, 0, 255], [170, 0, 255], [255, 0, 255],
-        [255, 0, 170], [255, 0, 85],
-    ]
+    if out is None:
+        canvas = np.zeros((H, W, 3), dtype=np.uint8)
+    else:
+        if out.shape != (H, W, 3) or out.dtype != np.uint8:
+            raise ValueError(f"out must be a ({H}, {W}, 3) uint8 array, got {out.shape} {out.dtype}")
+        canvas = out
+        canvas.fill(0)
 
-    stickwidth = 4
+    if draw_body and poses:
+        # Stack every body into one (people, 18, 3) array (extra rows dropped, short bodies
+        # padded as missing) so coordinates and masks for the whole frame take one pass
+        bodies = np.zeros((len(poses), len(_COLORS), 3))
+        for i, pose in enumerate(poses):
+            kp_array = _body_kp_array(pose.body)[:len(_COLORS)]
+            bodies[i, :len(kp_array)] = kp_array
+        # Integer pixel coordinates (truncated like int()) and one mask of points that are
+        # present and on the canvas, so each limb only needs a lookup
+        xy = bodies[..., :2].astype(np.int64)
+        in_canvas = (
+            (bodies[..., 2] > 0)
+            & (xy[..., 0] >= 0) & (xy[..., 0] < W)
+            & (xy[..., 1] >= 0) & (xy[..., 1] < H)
+        )
+        all_limbs_drawable = in_canvas[:, _LIMB_SEQ].all(axis=2).tolist()
+        all_joints_drawable = in_canvas.tolist()
+        all_coords = xy.tolist()
 
-    for pose in poses:
+    for i, pose in enumerate(poses):
         # Draw body
         if draw_body and pose.body.keypoints:
-            keypoints = pose.body.keypoints
-            for (k1_idx, k2_idx), color in zip(limbSeq, colors):
-                k1, k2 = keypoints[k1_idx - 1], keypoints[k2_idx - 1]
-                if k1 is not None and k2 is not None:
-                    x1, y1 = int(k1.x), int(k1.y)
-                    x2, y2 = int(k2.x), int(k2.y)
-                    if 0 <= x1 < W and 0 <= y1 < H and 0 <= x2 < W and 0 <= y2 < H:
-                        cv2.line(canvas, (x1, y1), (x2, y2), color, stickwidth)
+            coords = all_coords[i]
+            for (k1, k2), color, drawable in zip(_LIMB_PAIRS, _COLOR_TUPLES, all_limbs_drawable[i]):
+                if drawable:
+                    cv2.line(canvas, coords[k1], coords[k2], color, _STICKWIDTH)
 
             # Draw joints
-            for keypoint, color in zip(keypoints, colors):
-                if keypoint is not None:
-                    x, y = int(keypoint.x), int(keypoint.y)
-                    if 0 <= x < W and 0 <= y < H:
-                        cv2.circle(canvas, (x, y), 3, color, -1)
+            for (x, y), drawable, color in zip(coords, all_joints_drawable[i], _COLOR_TUPLES):
+                if drawable:
+                    cv2.circle(canvas, (x, y), 3, color, -1)
 
         # Draw hands
         if draw_hand:
-            for hand in [pose.left_hand, pose.right_hand]:
+            for hand, hand_array in [
+                (pose.left_hand, getattr(pose, "left_hand_array", None)),
+                (pose.right_hand, getattr(pose, "right_hand_array", None)),
+            ]:
                 if hand:
-                    _draw_hand_or_face(canvas, hand, W, H)
+                    _draw_hand_or_face(canvas, _points_kp_array(hand, hand_array), W, H)
 
         # Draw face
         if draw_face and pose.face:
-            _draw_hand_or_face(canvas, pose.face, W, H)
+            _draw_hand_or_face(canvas, _points_kp_array(pose.face, getattr(pose, "face_array", None)), W, H)
 
     return canvas
 
 
-def _draw_hand_or_face(canvas: np.ndarray, keypoints: List[Optional[Keypoint]], W: int, H: int):
-    """Draw hand or face keypoints."""
-    if not keypoints:
+def _keypoints_to_array(keypoints: List[Optional[Keypoint]]) -> np.ndarray:
+    """(N, 3) array of (x, y, 1) rows for a Keypoint list, with zero rows where a keypoint is None."""
+    return np.array(
+        [(k.x, k.y, 1.0) if k is not None else (0.0, 0.0, 0.0) for k in keypoints],
+        dtype=np.float64,
+    ).reshape(-1, 3)
+
+
+def _body_kp_array(body: BodyResult) -> np.ndarray:
+    """Return the (N, 3) keypoint array of a BodyResult, deriving it from the Keypoint list if absent."""
+    kp_array = getattr(body, "kp_array", None)
+    return kp_array if kp_array is not None else _keypoints_to_array(body.keypoints)
+
+
+def _points_kp_array(keypoints: List[Optional[Keypoint]], kp_array: Optional[np.ndarray]) -> np.ndarray:
+    """Return the decoded array for a hand or face, deriving it from the Keypoint list if absent."""
+    return kp_array if kp_array is not None else _keypoints_to_array(keypoints)
+
+
+def _draw_hand_or_face(canvas: np.ndarray, kp_array: np.ndarray, W: int, H: int):
+    """Draw hand or face keypoints from an (N, 3) array of (x, y, score) rows."""
+    if not len(kp_array):
         return
-    
-    color = [0, 255, 255]  # Cyan for hands/faces
-    for keypoint in keypoints:
-        if keypoint is not None:
-            x, y = int(keypoint.x), int(keypoint.y)
-            if 0 <= x < W and 0 <= y < H:
-                cv2.circle(canvas, (x, y), 2, color, -1)
+
+    # Truncate like int() and keep only present, on-canvas points before touching OpenCV
+    xy = kp_array[:, :2].astype(np.int64)
+    drawable = (
+        (kp_array[:, 2] > 0)
+        & (xy[:, 0] >= 0) & (xy[:, 0] < W)
+        & (xy[:, 1] >= 0) & (xy[:, 1] < H)
+    )
+    color = (0, 255, 255)  # Cyan for hands/faces
+    for x, y in xy[drawable].tolist():
+        cv2.circle(canvas, (x, y), 2, color, -1)
@@ -5,8 +5,10 @@ Tests the node with realistic pose data and ComfyUI workflow simulation.
 """
 
 import sys
+import copy
 import json
 import numpy as np
+import torch
 from pathlib import Path
 
 # Add current directory and parent to path for imports
@@ -18,42 +20,86 @@ sys.path.insert(0, str(current_dir.parent))
 from nodes import DwRestorator
 
 
+# Fixture keypoints, built once at import. Body: 18 points (x, y, confidence)
+_BASE_BODY_KEYPOINTS = [
+    # Head region
+    256.0, 100.0, 0.95,   # 0: Nose
+    240.0, 90.0, 0.92,    # 1: Left Eye
+    272.0, 90.0, 0.92,    # 2: Right Eye
+    230.0, 110.0, 0.85,   # 3: Left Ear
+    282.0, 110.0, 0.85,   # 4: Right Ear
+    # Shoulder to Elbow to Wrist (Left)
+    220.0, 180.0, 0.90,   # 5: Left Shoulder
+    180.0, 250.0, 0.88,   # 6: Left Elbow
+    0.0, 0.0, 0.0,        # 7: Left Wrist (MISSING)
+    # Shoulder to Elbow to Wrist (Right)
+    292.0, 180.0, 0.90,   # 8: Right Shoulder
+    332.0, 250.0, 0.88,   # 9: Right Elbow
+    380.0, 320.0, 0.85,   # 10: Right Wrist
+    # Hips
+    240.0, 320.0, 0.89,   # 11: Left Hip
+    272.0, 320.0, 0.89,   # 12: Right Hip
+    # Knees
+    230.0, 420.0, 0.87,   # 13: Left Knee
+    282.0, 420.0, 0.87,   # 14: Right Knee
+    # Ankles
+    220.0, 500.0, 0.85,   # 15: Left Ankle
+    292.0, 500.0, 0.85,   # 16: Right Ankle
+    # Neck
+    256.0, 140.0, 0.90,   # 17: Neck
+]
+
+# Reference person (complete, good quality)
+_REF_PERSON = {
+    "person_id": [0],
+    # Complete body keypoints
+    "pose_keypoints_2d": [
+        # Head region
+        256.0, 100.0, 0.98,   # 0: Nose
+        240.0, 90.0, 0.96,    # 1: Left Eye
+        272.0, 90.0, 0.96,    # 2: Right Eye
+        230.0, 110.0, 0.90,   # 3: Left Ear
+        282.0, 110.0, 0.90,   # 4: Right Ear
+        # Shoulder to Elbow to Wrist (Left)
+        220.0, 180.0, 0.95,   # 5: Left Shoulder
+        170.0, 260.0, 0.94,   # 6: Left Elbow
+        120.0, 340.0, 0.92,   # 7: Left Wrist
+        # Shoulder to Elbow to Wrist (Right)
+        292.0, 180.0, 0.95,   # 8: Right Shoulder
+        342.0, 260.0, 0.94,   # 9: Right Elbow
+        392.0, 340.0, 0.92,   # 10: Right Wrist
+        # Hips
+        240.0, 320.0, 0.93,   # 11: Left Hip
+        272.0, 320.0, 0.93,   # 12: Right Hip
+        # Knees
+        230.0, 420.0, 0.91,   # 13: Left Knee
+        282.0, 420.0, 0.91,   # 14: Right Knee
+        # Ankles
+        220.0, 500.0, 0.90,   # 15: Left Ankle
+        292.0, 500.0, 0.90,   # 16: Right Ankle
+        # Neck
+        256.0, 140.0, 0.95,   # 17: Neck
+    ],
+    "hand_left_keypoints_2d": [0.0] * 63,
+    "hand_right_keypoints_2d": [0.0] * 63,
+    "face_keypoints_2d": [0.0] * 210,
+}
+
+
 def create_test_pose(num_people=1, width=512, height=512):
     """Create a realistic DWPose JSON structure for testing."""
     pose_data = {
         "people": []
     }
-    
+
     for person_idx in range(num_people):
+        # Shift each person right by 50px; missing keypoints stay at (0, 0, 0)
+        shift = person_idx * 50
         person = {
             "person_id": [person_idx],
-            # Body keypoints: 18 points (x, y, confidence)
             "pose_keypoints_2d": [
-                # Head region
-                256.0 + person_idx * 50, 100.0, 0.95,   # 0: Nose
-                240.0 + person_idx * 50, 90.0, 0.92,    # 1: Left Eye
-                272.0 + person_idx * 50, 90.0, 0.92,    # 2: Right Eye
-                230.0 + person_idx * 50, 110.0, 0.85,   # 3: Left Ear
-                282.0 + person_idx * 50, 110.0, 0.85,   # 4: Right Ear
-                # Shoulder to Elbow to Wrist (Left)
-                220.0 + person_idx * 50, 180.0, 0.90,   # 5: Left Shoulder
-                180.0 + person_idx * 50, 250.0, 0.88,   # 6: Left Elbow
-                0.0, 0.0, 0.0,                           # 7: Left Wrist (MISSING)
-                # Shoulder to Elbow to Wrist (Right)
-                292.0 + person_idx * 50, 180.0, 0.90,   # 8: Right Shoulder
-                332.0 + person_idx * 50, 250.0, 0.88,   # 9: Right Elbow
-                380.0 + person_idx * 50, 320.0, 0.85,   # 10: Right Wrist
-                # Hips
-                240.0 + person_idx * 50, 320.0, 0.89,   # 11: Left Hip
-                272.0 + person_idx * 50, 320.0, 0.89,   # 12: Right Hip
-                # Knees
-                230.0 + person_idx * 50, 420.0, 0.87,   # 13: Left Knee
-                282.0 + person_idx * 50, 420.0, 0.87,   # 14: Right Knee
-                # Ankles
-                220.0 + person_idx * 50, 500.0, 0.85,   # 15: Left Ankle
-                292.0 + person_idx * 50, 500.0, 0.85,   # 16: Right Ankle
-                # Neck
-                256.0 + person_idx * 50, 140.0, 0.90,   # 17: Neck
+                v + shift if j % 3 == 0 and _BASE_BODY_KEYPOINTS[j + 2] > 0 else v
+                for j, v in enumerate(_BASE_BODY_KEYPOINTS)
             ],
             # Hand keypoints: 21 per hand (left and right)
             "hand_left_keypoints_2d": [0.0] * 63,  # 21 points * 3
@@ -62,79 +108,42 @@ def create_test_pose(num_people=1, width=512, height=512):
             "face_keypoints_2d": [0.0] * 210,  # 70 points * 3
         }
         pose_data["people"].append(person)
-    
+
     return pose_data
 
 
 def create_reference_pose(width=512, height=512):
     """Create a reference pose (complete, good quality)."""
-    pose_data = {
-        "people": [
-            {
-                "person_id": [0],
-                # Complete body keypoints
-                "pose_keypoints_2d": [
-                    # Head region
-                    256.0, 100.0, 0.98,   # 0: Nose
-                    240.0, 90.0, 0.96,    # 1: Left Eye
-                    272.0, 90.0, 0.96,    # 2: Right Eye
-                    230.0, 110.0, 0.90,   # 3: Left Ear
-                    282.0, 110.0, 0.90,   # 4: Right Ear
-                    # Shoulder to Elbow to Wrist (Left)
-                    220.0, 180.0, 0.95,   # 5: Left Shoulder
-                    170.0, 260.0, 0.94,   # 6: Left Elbow
-                    120.0, 340.0, 0.92,   # 7: Left Wrist
-                    # Shoulder to Elbow to Wrist (Right)
-                    292.0, 180.0, 0.95,   # 8: Right Shoulder
-                    342.0, 260.0, 0.94,   # 9: Right Elbow
-                    392.0, 340.0, 0.92,   # 10: Right Wrist
-                    # Hips
-                    240.0, 320.0, 0.93,   # 11: Left Hip
-                    272.0, 320.0, 0.93,   # 12: Right Hip
-                    # Knees
-                    230.0, 420.0, 0.91,   # 13: Left Knee
-                    282.0, 420.0, 0.91,   # 14: Right Knee
-                    # Ankles
-                    220.0, 500.0, 0.90,   # 15: Left Ankle
-                    292.0, 500.0, 0.90,   # 16: Right Ankle
-                    # Neck
-                    256.0, 140.0, 0.95,   # 17: Neck
-                ],
-                "hand_left_keypoints_2d": [0.0] * 63,
-                "hand_right_keypoints_2d": [0.0] * 63,
-                "face_keypoints_2d": [0.0] * 210,
-            }
-        ]
-    }
-    return pose_data
+    return {"people": [copy.deepcopy(_REF_PERSON)]}
 
 
 def test_node_initialization():
     """Test that the node initializes correctly."""
     print("\n[TEST 1] Node Initialization")
     print("-" * 70)
-    
+
     try:
         node = DwRestorator()
         print("✓ Node initialized successfully")
-        
+
         # Check INPUT_TYPES
         input_types = node.INPUT_TYPES()
         required_inputs = input_types.get("required", {})
         optional_inputs = input_types.get("optional", {})
-        
+
         assert "pose_keypoints" in required_inputs, "Missing 'pose_keypoints' in required inputs"
         print("✓ Required inputs defined correctly")
-        
+
         assert "reduce_confidence" in optional_inputs, "Missing 'reduce_confidence' in optional inputs"
         assert "use_gpu" in optional_inputs, "Missing 'use_gpu' in optional inputs"
+        assert "render_image" in optional_inputs, "Missing 'render_image' in optional inputs"
         print("✓ Optional inputs defined correctly")
-        
+
         # Check RETURN_TYPES (it's a tuple, not callable)
         return_types = node.RETURN_TYPES
         assert return_types[0] == "IMAGE", "First return type should be IMAGE"
         print("✓ Return types defined correctly")
-        
+
         return True
     except Exception as e:
         print(f"✗ Initialization failed: {e}")
@@ -147,20 +156,20 @@ def test_node_with_missing_keypoints():
     """Test node with missing keypoints (main use case)."""
     print("\n[TEST 2] Restoration with Missing Keypoints")
     print("-" * 70)
-    
+
     try:
         node = DwRestorator()
-        
+
         # Create test data
         pose_with_gaps = create_test_pose(num_people=1)
         ref_pose = create_reference_pose()
-        
+
         # Check that left wrist is missing in test pose
         test_pose_data = pose_with_gaps["people"][0]["pose_keypoints_2d"]
         left_wrist_idx = 7 * 3  # Wrist is keypoint 7
         assert test_pose_data[left_wrist_idx:left_wrist_idx+3] == [0.0, 0.0, 0.0], "Test pose should have missing left wrist"
         print("✓ Test pose has missing left wrist as expected")
-        
+
         # Run restoration (pass dicts, not JSON strings)
         image_tensor, restored_pose = node.dwrestore(
             pose_keypoints=pose_with_gaps,
@@ -169,30 +178,29 @@ def test_node_with_missing_keypoints():
             confidence_reduction_factor=0.7,
             use_gpu=False
         )
-        
+
         # Check output types
         assert image_tensor is not None, "Image tensor should not be None"
         print(f"✓ Image tensor generated: shape {image_tensor.shape}")
-        
-        # restored_pose should be a dict or JSON string, check both
-        if isinstance(restored_pose, str):
-            restored_data = json.loads(restored_pose)
-        else:
-            restored_data = restored_pose
-        
+
+        # restored_pose is returned as an in-memory dict that must stay JSON-serializable
+        assert isinstance(restored_pose, dict), f"Restored pose should be a dict, got {type(restored_pose)}"
+        restored_data = restored_pose
+        json.dumps(restored_data)
+
         assert "people" in restored_data, "Restored pose should have 'people' key"
         print("✓ Restored pose is valid")
-        
+
         # Check that left wrist was restored
         restored_pose_data = restored_data["people"][0]["pose_keypoints_2d"]
         restored_wrist = restored_pose_data[left_wrist_idx:left_wrist_idx+3]
         assert restored_wrist[2] > 0, f"Restored wrist should have confidence > 0, got {restored_wrist[2]}"
         print(f"✓ Left wrist restored: [{restored_wrist[0]:.1f}, {restored_wrist[1]:.1f}, {restored_wrist[2]:.2f}]")
-        
+
         # Check that in-canvas restored points are preserved
         assert restored_wrist[0] > 0 and restored_wrist[1] > 0, "Restored wrist should have valid coordinates"
         print(f"✓ Restored coordinates are valid (in-canvas)")
-        
+
         return True
     except Exception as e:
         print(f"✗ Test failed: {e}")
@@ -205,7 +213,7 @@ def test_out_of_canvas_handling():
     """Test that out-of-canvas keypoints are handled correctly."""
     print("\n[TEST 3] Out-of-Canvas Keypoint Handling")
     print("-" * 70)
-    
+
     try:
         # Create pose with out-of-canvas keypoint
         pose_data = {
@@ -226,10 +234,10 @@ def test_out_of_canvas_handling():
                 }
             ]
         }
-        
+
         # Run without reference (should handle gracefully)
         node = DwRestorator()
-        
+
         # Create a minimal reference pose
         ref_pose = {
             "people": [
@@ -242,26 +250,24 @@ def test_out_of_canvas_handling():
                 }
             ]
         }
-        
+
         image_tensor, restored_pose = node.dwrestore(
             pose_keypoints=pose_data,
             ref_pose=ref_pose,
             use_gpu=False
         )
-        
+
         # Check that output is valid
         assert image_tensor is not None, "Should generate image even with out-of-canvas points"
         print("✓ Image generated despite out-of-canvas keypoints")
-        
-        if isinstance(restored_pose, str):
-            restored_data = json.loads(restored_pose)
-        else:
-            restored_data = restored_pose
-        
+
+        assert isinstance(restored_pose, dict), f"Restored pose should be a dict, got {type(restored_pose)}"
+        restored_data = restored_pose
+
         # Check that output is valid
         assert "people" in restored_data, "Should have people key"
         print("✓ Out-of-canvas handling completed without errors")
-        
+
         return True
     except Exception as e:
         print(f"✗ Test failed: {e}")
@@ -274,11 +280,11 @@ def test_gpu_fallback():
     """Test that use_gpu flag falls back to CPU gracefully."""
     print("\n[TEST 4] GPU Fallback (use_gpu=True)")
     print("-" * 70)
-    
+
     try:
         node = DwRestorator()
         pose_data = create_test_pose(num_people=1)
-        
+
         # Create minimal reference
         ref_pose = {
             "people": [{
@@ -289,17 +295,17 @@ def test_gpu_fallback():
                 "face_keypoints_2d": [0.0] * 210,
             }]
         }
-        
+
         # Try with use_gpu=True (should fall back to CPU if no CUDA)
         image_tensor, restored_pose = node.dwrestore(
             pose_keypoints=pose_data,
             ref_pose=ref_pose,
             use_gpu=True  # Request GPU but should fallback
         )
-        
+
         assert image_tensor is not None, "Should work even if GPU not available"
         print("✓ GPU flag handled correctly (CPU fallback if needed)")
-        
+
         return True
     except Exception as e:
         print(f"✗ Test failed: {e}")
@@ -312,27 +318,198 @@ def test_multiple_people():
     """Test with multiple people in one frame."""
     print("\n[TEST 5] Multiple People in Frame")
     print("-" * 70)
-    
+
     try:
         node = DwRestorator()
         pose_data = create_test_pose(num_people=2)  # Two people
         ref_pose = create_reference_pose()
-        
+
         # Run restoration (pass dicts, not JSON strings)
         image_tensor, restored_pose = node.dwrestore(
             pose_keypoints=pose_data,
             ref_pose=ref_pose,
             use_gpu=False
         )
-        
-        if isinstance(restored_pose, str):
-            restored_data = json.loads(restored_pose)
-        else:
-            restored_data = restored_pose
-        
+
+        assert isinstance(restored_pose, dict), f"Restored pose should be a dict, got {type(restored_pose)}"
+        restored_data = restored_pose
+
         assert len(restored_data["people"]) == 2, "Should process both people"
         print(f"✓ Processed {len(restored_data['people'])} people successfully")
-        
+
+        return True
+    except Exception as e:
+        print(f"✗ Test failed: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_render_image_disabled():
+    """Test that render_image=False skips drawing but still restores keypoints."""
+    print("\n[TEST 6] Image Rendering Disabled (render_image=False)")
+    print("-" * 70)
+
+    try:
+        node = DwRestorator()
+        pose_data = create_test_pose(num_people=1, width=640, height=480)
+        pose_data["canvas_width"] = 640
+        pose_data["canvas_height"] = 480
+        ref_pose = create_reference_pose()
+
+        image_tensor, restored_pose = node.dwrestore(
+            pose_keypoints=pose_data,
+            ref_pose=ref_pose,
+            use_gpu=False,
+            render_image=False
+        )
+
+        assert tuple(image_tensor.shape) == (1, 480, 640, 3), f"Blank image should match canvas, got {tuple(image_tensor.shape)}"
+        assert float(image_tensor.abs().sum()) == 0.0, "Image should be blank when rendering is disabled"
+        print("✓ Blank canvas-sized image returned without drawing")
+
+        # A downstream in-place edit must not show up in the next blank image
+        image_tensor.fill_(1.0)
+        next_image, _ = node.dwrestore(pose_keypoints=pose_data, ref_pose=ref_pose, use_gpu=False, render_image=False)
+        assert float(next_image.abs().sum()) == 0.0, "Blank image should not be shared between calls"
+        print("✓ Each call returns its own blank image")
+
+        restored_wrist = restored_pose["people"][0]["pose_keypoints_2d"][7 * 3:7 * 3 + 3]
+        assert restored_wrist[2] > 0, "Keypoints should still be restored"
+        print("✓ Keypoints restored with rendering disabled")
+
+        return True
+    except Exception as e:
+        print(f"✗ Test failed: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_chain_restoration():
+    """Test that a child whose parent is also missing is restored from the restored parent."""
+    print("\n[TEST 7] Chained Restoration (parent and child both missing)")
+    print("-" * 70)
+
+    try:
+        node = DwRestorator()
+        pose_data = create_test_pose(num_people=1)
+        # Keypoint 9 hangs off keypoint 7 in BODY_HIERARCHY; 7 is already missing
+        pose_data["people"][0]["pose_keypoints_2d"][9 * 3:9 * 3 + 3] = [0.0, 0.0, 0.0]
+        ref_pose = create_reference_pose()
+
+        image_tensor, restored_pose = node.dwrestore(
+            pose_keypoints=pose_data,
+            ref_pose=ref_pose,
+            reduce_confidence=True,
+            confidence_reduction_factor=0.7,
+            use_gpu=False
+        )
+
+        restored = restored_pose["people"][0]["pose_keypoints_2d"]
+        parent, child = restored[7 * 3:7 * 3 + 3], restored[9 * 3:9 * 3 + 3]
+        assert parent[2] > 0, f"Parent should be restored, got {parent}"
+        assert child[2] > 0, f"Child should be restored from the restored parent, got {child}"
+        print(f"✓ Parent restored: {parent}")
+        print(f"✓ Child restored: {child}")
+
+        assert child[2] <= parent[2], "Child confidence should not exceed its restored parent's"
+        print("✓ Confidence decreases down the chain")
+
+        return True
+    except Exception as e:
+        print(f"✗ Test failed: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_multi_person_out_of_canvas_rendering():
+    """Test that out-of-canvas keypoints of every drawn person are left out of the image."""
+    print("\n[TEST 8] Multi-Person Out-of-Canvas Rendering")
+    print("-" * 70)
+
+    try:
+        ref_pose = create_reference_pose()
+
+        def render(second_wrist):
+            pose_data = create_test_pose(num_people=2)
+            # Right wrist (10) of the second person, the end of the 9 -> 10 limb
+            pose_data["people"][1]["pose_keypoints_2d"][10 * 3:10 * 3 + 3] = second_wrist
+            image_tensor, _ = DwRestorator().dwrestore(pose_keypoints=pose_data, ref_pose=ref_pose, use_gpu=False)
+            return image_tensor.cpu().numpy()
+
+        missing = render([0.0, 0.0, 0.0])
+        # Just left of the canvas: int() truncation would land it on column 0
+        barely_out = render([-0.5, 320.0, 0.85])
+        far_out = render([600.0, 320.0, 0.85])
+        on_edge = render([0.0, 320.0, 0.85])
+
+        assert np.array_equal(barely_out, missing), "x=-0.5 on a later person should be drawn as missing"
+        assert np.array_equal(far_out, missing), "x=600 on a later person should be drawn as missing"
+        print("✓ Out-of-canvas keypoints of the second person are not drawn")
+
+        assert not np.array_equal(on_edge, missing), "An in-canvas keypoint at x=0 should still be drawn"
+        print("✓ In-canvas keypoint on the left edge is still drawn")
+
+        return True
+    except Exception as e:
+        print(f"✗ Test failed: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_reference_edited_between_frames():
+    """Test that editing the reference keypoint list in place is picked up on the next frame."""
+    print("\n[TEST 9] Reference Edited In Place Between Frames")
+    print("-" * 70)
+
+    try:
+        node = DwRestorator()
+        ref_pose = create_reference_pose()
+        node.dwrestore(pose_keypoints=create_test_pose(num_people=1), ref_pose=ref_pose, use_gpu=False)
+
+        # Move the reference left wrist (7) without replacing the list object
+        ref_pose["people"][0]["pose_keypoints_2d"][7 * 3:7 * 3 + 3] = [100.0, 360.0, 0.92]
+
+        _, reused = node.dwrestore(pose_keypoints=create_test_pose(num_people=1), ref_pose=ref_pose, use_gpu=False)
+        _, fresh = DwRestorator().dwrestore(pose_keypoints=create_test_pose(num_people=1), ref_pose=ref_pose, use_gpu=False)
+
+        reused_wrist = reused["people"][0]["pose_keypoints_2d"][7 * 3:7 * 3 + 3]
+        fresh_wrist = fresh["people"][0]["pose_keypoints_2d"][7 * 3:7 * 3 + 3]
+        assert reused_wrist == fresh_wrist, f"Stale reference reused: {reused_wrist} vs fresh node {fresh_wrist}"
+        print(f"✓ Edited reference used on the next frame: {reused_wrist}")
+
+        return True
+    except Exception as e:
+        print(f"✗ Test failed: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_cached_image_not_aliased():
+    """Test that in-place edits to a returned pose image do not leak into later frames."""
+    print("\n[TEST 10] Cached Pose Image Not Aliased")
+    print("-" * 70)
+
+    try:
+        node = DwRestorator()
+        ref_pose = create_reference_pose()
+
+        first, _ = node.dwrestore(pose_keypoints=create_test_pose(num_people=1), ref_pose=ref_pose, use_gpu=False)
+        expected = first.clone()
+        # A downstream node scribbling over its input
+        first.mul_(0)
+
+        for frame in range(2):
+            image, _ = node.dwrestore(pose_keypoints=create_test_pose(num_people=1), ref_pose=ref_pose, use_gpu=False)
+            assert image.data_ptr() != first.data_ptr(), "Unchanged frame should not return the previous tensor"
+            assert torch.equal(image, expected), f"Frame {frame} image was corrupted by an earlier in-place edit"
+            image.clamp_(0.0, 0.0)
+        print("✓ Unchanged frames return intact copies of the cached image")
+
         return True
     except Exception as e:
         print(f"✗ Test failed: {e}")
@@ -346,15 +523,20 @@ def main():
     print("=" * 70)
     print("DwRestorator Node - Integration Tests")
     print("=" * 70)
-    
+
     tests = [
         test_node_initialization,
         test_node_with_missing_keypoints,
         test_out_of_canvas_handling,
         test_gpu_fallback,
         test_multiple_people,
+        test_render_image_disabled,
+        test_chain_restoration,
+        test_multi_person_out_of_canvas_rendering,
+        test_reference_edited_between_frames,
+        test_cached_image_not_aliased,
     ]
-    
+
     results = []
     for test in tests:
         try:
@@ -365,22 +547,22 @@ def main():
             import traceback
             traceback.print_exc()
             results.append((test.__name__, False))
-    
+
     # Summary
     print("\n" + "=" * 70)
     print("Test Summary")
     print("=" * 70)
-    
+
     passed = sum(1 for _, result in results if result)
     total = len(results)
-    
+
     for name, result in results:
         status = "✓ PASS" if result else "✗ FAIL"
         print(f"{status}: {name}")
-    
+
     print(f"\nTotal: {passed}/{total} tests passed")
     print("=" * 70)
-    
+
     return passed == total
 
 